@@ -1,44 +1,47 @@
 import subprocess
 import sys
+from pretty_print import print_failure, print_success, print_test
 
-
-def __print_success(message):
-    print(f"\033[32m{message}\033[0m")
-
-
-def __print_failure(message):
-    print(f"\033[31m{message}\033[0m")
-
-
-def __print_test(message):
-    width = 60
-    dot_count = width - len(message)
-    print(f"{message}{'.' * max(dot_count, 1)}", end="", flush=True)
+try:
+    import av
+except ImportError:
+    av = None
 
 
 def check_stream_accessible(url):
-    __print_test("Checking if stream is accessible")
-    output = subprocess.run(
-        [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "v:0",
-            "-show_entries",
-            "stream=width,height",
-            "-of",
-            "csv=s=x:p=0",
-            url,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    output = output.stdout.decode("utf-8")
-    if "N/A" in output:
-        __print_failure("Failed! Stream not accessible.")
+    print_test("Checking if stream is accessible")
+    if av is not None:
+        # Probe the stream in-process with PyAV instead of spawning an ffprobe process
+        try:
+            with av.open(url, timeout=5) as container:
+                stream = container.streams.video[0]
+                accessible = bool(stream.width and stream.height)
+        except (av.error.FFmpegError, IndexError):
+            accessible = False
+    else:
+        output = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "stream=width,height",
+                "-of",
+                "csv=s=x:p=0",
+                url,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output = output.stdout.decode("utf-8")
+        accessible = "N/A" not in output
+
+    if not accessible:
+        print_failure("Failed! Stream not accessible.")
         return False
-    __print_success("Success! Stream accessible.")
+    print_success("Success! Stream accessible.")
     return True
 
 
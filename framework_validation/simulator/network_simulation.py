@@ -1,22 +1,9 @@
 import subprocess
-
-
-def __print_success(message):
-    print(f"\033[32m{message}\033[0m")
-
-
-def __print_failure(message):
-    print(f"\033[31m{message}\033[0m")
-
-
-def __print_test(message):
-    width = 60
-    dot_count = width - len(message)
-    print(f"{message}{'.' * max(dot_count, 1)}", end="", flush=True)
+from pretty_print import print_failure, print_success, print_test
 
 
 def check_qdisc():
-    __print_test("Checking if qdisc is set in the loopback interface")
+    print_test("Checking if qdisc is set in the loopback interface")
     output = subprocess.run(
         ["tc", "qdisc", "show", "dev", "lo"],
         stdout=subprocess.PIPE,
@@ -26,9 +13,9 @@ def check_qdisc():
 
     # Check if the qdisc is set
     if "noqueue" in output:
-        __print_failure("Failed! No qdisc set in the loopback interface.")
+        print_failure("Failed! No qdisc set in the loopback interface.")
         return False
-    __print_success("Success! Qdisc set in the loopback interface.")
+    print_success("Success! Qdisc set in the loopback interface.")
     return True
 
 
@@ -40,4 +27,4 @@ if __name__ == "__main__":
         failed_tests.append("check_qdisc")
 
     if error_count > 0:
-        __print_failure(f"Failed! {error_count} tests failed: {', '.join(failed_tests)}")
+        print_failure(f"Failed! {error_count} tests failed: {', '.join(failed_tests)}")
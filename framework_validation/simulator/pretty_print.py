@@ -0,0 +1,20 @@
+"""
+This module contains the shared helpers for printing the results of the simulation checks.
+It should not be run, but imported by the simulation check scripts.
+"""
+
+WIDTH = 60
+DOT_LINE = "." * WIDTH
+
+
+def print_success(message):
+    print(f"\033[32m{message}\033[0m")
+
+
+def print_failure(message):
+    print(f"\033[31m{message}\033[0m")
+
+
+def print_test(message):
+    dot_count = WIDTH - len(message)
+    print(f"{message}{DOT_LINE[:max(dot_count, 1)]}", end="", flush=True)
@@ -4,3 +4,8 @@ STREAMING_PROTOCOL = "rtsp"
 STREAMING_HOST = "localhost"
 STREAMING_URL = STREAMING_PROTOCOL + "://" + STREAMING_HOST + ":" + str(STREAMING_PORT) + STREAMING_PATH
 NETWORK_INTERFACE = "lo"
+MULTICAST_MIN_ADDRESS = "239.255.42.0"
+MULTICAST_MAX_ADDRESS = "239.255.42.255"
+MULTICAST_MIN_PORT = 5000
+MULTICAST_MAX_PORT = 5999
+MULTICAST_TTL = 1
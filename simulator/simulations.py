@@ -2,25 +2,401 @@
 """
 This is the simulations module for defining different simulation types for the RTSP server.
 It should not be run, but imported by the simulator script.
+The network simulations change the qdisc of the network interface, which requires CAP_NET_ADMIN. Grant it to the
+simulator process, e.g. with systemd's AmbientCapabilities=CAP_NET_ADMIN or by running as root, to configure qdiscs
+without sudo. Otherwise every qdisc change runs through sudo.
 """
 
+import functools
+import itertools
+import os
+import re
+import shutil
 import subprocess
 from config import NETWORK_INTERFACE
 
-streams_simulated = 0
+try:
+    import pyroute2
+except ImportError:
+    pyroute2 = None
+
+try:
+    import gi
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+except (ImportError, ValueError):
+    Gst = None
+
+# Number the streams of the hardware failure and camera delay simulations, each starting at 1
+hardware_failure_streams = itertools.count(1)
+camera_delay_streams = itertools.count(1)
+
+# Multipliers converting tc time units to microseconds
+TIME_UNITS = {"s": 1000000, "sec": 1000000, "ms": 1000, "msec": 1000, "us": 1, "usec": 1}
+# Multipliers converting tc rate units to bytes per second
+RATE_UNITS = {"bit": 1 / 8, "kbit": 1000 / 8, "mbit": 1000000 / 8, "gbit": 1000000000 / 8, "bps": 1, "kbps": 1000}
+# Multipliers converting tc size units to bytes
+SIZE_UNITS = {
+    "b": 1,
+    "k": 1024,
+    "kb": 1024,
+    "m": 1024 * 1024,
+    "mb": 1024 * 1024,
+    "kbit": 1024 / 8,
+    "mbit": 1024 * 1024 / 8,
+}
+# H.264 encoders in order of preference, hardware encoders first, all at the same bitrate. The software fallback is
+# tuned for real-time encoding without B-frames, trading quality for speed like the low latency hardware presets. It
+# keeps the default avc stream format, which matroskamux requires
+H264_ENCODERS = (
+    ("nvh264enc", "nvh264enc bitrate=500 preset=low-latency-hq"),
+    ("vah264enc", "vah264enc bitrate=500"),
+    ("vaapih264enc", "vaapih264enc bitrate=500"),
+    ("x264enc", "x264enc bitrate=500 tune=zerolatency speed-preset=veryfast bframes=0 key-int-max=30"),
+)
+# ffmpeg H.264 hardware encoders in order of preference, used for the camera simulations when one works on this host
+FFMPEG_HARDWARE_ENCODERS = ("h264_nvenc", "h264_qsv")
+# Software encoder settings for the camera simulations, which favour encoding speed over quality as the processed
+# videos are only test fixtures. The encoder is named explicitly, as the presets and tunes are libx264 options and the
+# default encoder for the output container may be a different one
+FFMPEG_SOFTWARE_ENCODING = ("-c:v", "libx264", "-preset", "ultrafast", "-tune", "fastdecode", "-g", "30")
+# ffmpeg options skipping the banner, progress statistics and informational messages, whose output is discarded anyway
+FFMPEG_QUIET = ("-hide_banner", "-nostats", "-loglevel", "error")
+
+# Queue between an encoder and the payloader, holding at most 200 ms of encoded video. It does not leak: the sources
+# are not live, so a full queue is what paces the encoder, and dropping encoded buffers would corrupt the stream
+ENCODED_QUEUE = "queue max-size-bytes=0 max-size-buffers=0 max-size-time=200000000"
+
+# GStreamer launch string templates, with the constant parts filled in once at import
+NORMAL_LAUNCH = "( filesrc location=./{video_file} ! tsdemux ! queue ! h265parse ! rtph265pay name=pay0 pt=96 )"
+AUDIO_SYNC_LAUNCH = (
+    "( filesrc location=./{video_file} ! decodebin name=dec "
+    "dec. ! queue ! audioconvert ! audioresample !"
+    "queue min-threshold-time={audio_delay_ms}000000 ! avenc_aac ! queue ! mux. "
+    "dec. ! videoconvert ! videoscale ! {encoder} ! queue ! mux. "
+    f"matroskamux name=mux ! {ENCODED_QUEUE} ! rtph264pay name=pay0 pt=96 )"
+)
+BLACK_SCREEN_LAUNCH = (
+    "( videotestsrc pattern=black ! video/x-raw,width=1920,height=1080,framerate=24/1 ! "
+    f"{{encoder}} ! {ENCODED_QUEUE} ! rtph264pay name=pay0 pt=96 )"
+)
+DELAYED_STREAM_LAUNCH = (
+    "( filesrc location=./{video_file} ! decodebin ! queue min-threshold-time=10000000000000000 ! "
+    f"{{encoder}} ! {ENCODED_QUEUE} ! rtph264pay name=pay0 pt=96 )"
+)
+
+# ffmpeg processes started by the camera simulations, with their output files and descriptions, which the simulator
+# waits for before serving the streams
+pending_transcodes = []
+# Maximum number of ffmpeg processes running at once
+MAX_PARALLEL_TRANSCODES = os.cpu_count() or 1
+
+# ------------------------- Traffic Control -------------------------
+
+
+def __has_net_admin_capability():
+    """
+    Check whether tc started by this process may change qdiscs without sudo.
+    This is the case for root, and for processes with CAP_NET_ADMIN in their ambient capabilities, which child
+    processes inherit.
+    Returns:
+        bool: True if tc can run without sudo, False otherwise.
+    """
+    if os.geteuid() == 0:
+        return True
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("CapAmb:"):
+                    # CAP_NET_ADMIN is capability number 12
+                    return bool(int(line.split()[1], 16) & (1 << 12))
+    except OSError:
+        pass
+    return False
+
+
+# Absolute paths of tc and sudo, resolved once so no PATH lookup happens per call. tc usually lives in an sbin
+# directory, which is not on the PATH of regular users
+TC_PATH = shutil.which("tc", path=os.pathsep.join((os.environ.get("PATH", os.defpath), "/usr/sbin", "/sbin")))
+TC_PATH = TC_PATH or "/usr/sbin/tc"
+SUDO_PATH = shutil.which("sudo") or "sudo"
+# The tc command, only run through sudo when the process cannot change qdiscs itself
+TC_COMMAND = (TC_PATH,) if __has_net_admin_capability() else (SUDO_PATH, TC_PATH)
+# The tc batch line replacing the root qdisc of the network interface, followed by the qdisc arguments
+TC_REPLACE_ROOT_QDISC = ("qdisc", "replace", "dev", NETWORK_INTERFACE, "root")
+# tc batch lines queued by the network simulations, which the simulator runs with one tc process
+pending_tc_commands = []
+# The tc batch lines of the qdisc configuration installed last, so simulating the next stream does not replace it again
+installed_qdisc = None
+
+
+def __parse_quantity(value, units, default_unit):
+    """
+    Convert a tc quantity such as "100ms" or "1mbit" to a number in the base unit of the given unit table.
+    Args:
+        value (str): The quantity with an optional unit suffix.
+        units (dict): Multipliers from unit suffixes to the base unit.
+        default_unit (str): The unit used when the quantity has no suffix.
+    Returns:
+        int: The quantity in the base unit.
+    """
+    number, unit = re.fullmatch(r"([0-9.]+)([a-zA-Z]*)", value).groups()
+    return int(float(number) * units[unit.lower() or default_unit])
+
+
+def __parse_time(value):
+    """
+    Convert a tc time such as "100ms" to microseconds.
+    """
+    return __parse_quantity(value, TIME_UNITS, "us")
+
+
+def __parse_rate(value):
+    """
+    Convert a tc rate such as "1mbit" to bytes per second.
+    """
+    return __parse_quantity(value, RATE_UNITS, "bit")
+
+
+def __parse_size(value):
+    """
+    Convert a tc size such as "32kbit" to bytes.
+    """
+    return __parse_quantity(value, SIZE_UNITS, "b")
+
+
+def __parse_handle(value):
+    """
+    Convert a tc handle such as "1:" or class id such as "1:1" to the number netlink uses.
+    """
+    major, minor = value.split(":")
+    return int(major, 16) << 16 | int(minor or "0", 16)
+
+
+def __parse_percentage(value):
+    """
+    Convert a tc percentage such as "10%" to a float.
+    """
+    return float(value.rstrip("%"))
+
+
+@functools.lru_cache(maxsize=1)
+def __open_netlink():
+    """
+    Open a netlink socket to the kernel and look up the network interface once per run.
+    Returns:
+        tuple: The pyroute2 IPRoute socket and the interface index, or None if pyroute2 is not installed or the
+            interface does not exist.
+    """
+    if pyroute2 is None:
+        return None
+    try:
+        ipr = pyroute2.IPRoute()
+    except OSError:
+        return None
+    indices = ipr.link_lookup(ifname=NETWORK_INTERFACE)
+    if not indices:
+        ipr.close()
+        return None
+    return ipr, indices[0]
+
+
+def __install_qdiscs(tc_lines, netlink_messages=None):
+    """
+    Configure the qdiscs of the network interface, unless the same configuration is already installed.
+    When pyroute2 is installed and the process may change qdiscs, the configuration is sent as netlink messages
+    instead of starting tc for every simulation. Otherwise the tc lines are queued in pending_tc_commands, for the
+    simulator to run all queued commands with a single tc batch.
+    Args:
+        tc_lines (list): The tc batch lines of the configuration as tuples of arguments, the root qdisc first.
+        netlink_messages (list): The (command, kind, parameters) of every pyroute2 tc call in the same order, or None
+            if netlink cannot express the configuration. Times are in microseconds, rates in bytes per second, sizes in
+            bytes and percentages are floats.
+    Returns:
+        None
+    """
+    global installed_qdisc
+    # Every stream of a run applies the same network simulation, so only the first one changes the qdiscs
+    configuration = tuple(tc_lines)
+    if configuration == installed_qdisc:
+        return
+    installed_qdisc = configuration
+
+    netlink = __open_netlink() if netlink_messages is not None else None
+    if netlink is not None:
+        ipr, index = netlink
+        try:
+            for command, kind, parameters in netlink_messages:
+                ipr.tc(command, kind, index, **parameters)
+            return
+        except pyroute2.NetlinkError:
+            # E.g. the process lacks CAP_NET_ADMIN, so let tc replace the qdiscs through sudo instead
+            pass
+    pending_tc_commands.extend(" ".join(line) for line in tc_lines)
+
+
+def __replace_qdisc(tc_arguments, kind=None, **netlink_parameters):
+    """
+    Replace the root qdisc of the network interface, unless it already is the given qdisc.
+    Args:
+        tc_arguments (list): The tc arguments following "root", e.g. ["netem", "loss", "10%"].
+        kind (str): The qdisc kind for pyroute2, or None if netlink cannot express these tc arguments.
+        netlink_parameters: The qdisc parameters for pyroute2.
+    Returns:
+        None
+    """
+    netlink_messages = [("replace", kind, netlink_parameters)] if kind is not None else None
+    __install_qdiscs([(*TC_REPLACE_ROOT_QDISC, *tc_arguments)], netlink_messages)
+
+
+def __netem_arguments(
+    delay=None, jitter=None, distribution=None, loss=None, duplicate=None, reorder=None, corrupt=None, rate=None
+):
+    """
+    Build the netem arguments for tc and pyroute2 combining all the given effects.
+    Args:
+        See __compose_netem.
+    Returns:
+        tuple: The tc arguments starting with "netem", and the netlink parameters, or None if netlink cannot express
+            the effects.
+    """
+    tc_arguments = ["netem"]
+    netlink_parameters = {}
+    if delay is not None:
+        tc_arguments += ["delay", delay]
+        netlink_parameters["delay"] = __parse_time(delay)
+        if jitter is not None:
+            tc_arguments.append(jitter)
+            netlink_parameters["jitter"] = __parse_time(jitter)
+            if distribution is not None:
+                tc_arguments += ["distribution", distribution]
+    if loss is not None:
+        tc_arguments += ["loss", loss]
+        netlink_parameters["loss"] = __parse_percentage(loss)
+    if duplicate is not None:
+        tc_arguments += ["duplicate", duplicate]
+        netlink_parameters["duplicate"] = __parse_percentage(duplicate)
+    if reorder is not None:
+        tc_arguments += ["reorder", reorder]
+        netlink_parameters["prob_reorder"] = __parse_percentage(reorder)
+    if corrupt is not None:
+        tc_arguments += ["corrupt", corrupt]
+        netlink_parameters["prob_corrupt"] = __parse_percentage(corrupt)
+    if rate is not None:
+        tc_arguments += ["rate", rate]
+        netlink_parameters["rate"] = __parse_rate(rate)
+    # Netlink cannot upload delay distribution tables, so those always go through tc
+    if "distribution" in tc_arguments:
+        netlink_parameters = None
+    return tc_arguments, netlink_parameters
+
+
+def __compose_netem(
+    handle=None,
+    delay=None,
+    jitter=None,
+    distribution=None,
+    loss=None,
+    duplicate=None,
+    reorder=None,
+    corrupt=None,
+    rate=None,
+):
+    """
+    Replace the root qdisc with one netem qdisc combining all the given effects.
+    Every effect is applied by the same qdisc replacement, so switching between network simulations never leaves
+    traffic passing through a partially configured qdisc.
+    Args:
+        handle (str): The handle of the qdisc, e.g. "1:".
+        delay (str): The delay to add to packets, e.g. "100ms".
+        jitter (str): The random variation in delay, only applied together with delay.
+        distribution (str): The distribution of the jitter, e.g. "normal", only applied together with jitter.
+        loss (str): Percentage of packets to drop.
+        duplicate (str): Percentage of packets to duplicate.
+        reorder (str): Percentage of packets to send immediately instead of delaying them, requires delay.
+        corrupt (str): Percentage of packets to corrupt.
+        rate (str): The maximum rate of traffic, e.g. "1mbit".
+    Returns:
+        None
+    """
+    tc_arguments, netlink_parameters = __netem_arguments(
+        delay, jitter, distribution, loss, duplicate, reorder, corrupt, rate
+    )
+    if netlink_parameters is None:
+        netlink_messages = None
+    else:
+        if handle is not None:
+            netlink_parameters["handle"] = __parse_handle(handle)
+        netlink_messages = [("replace", "netem", netlink_parameters)]
+    if handle is not None:
+        tc_arguments = ["handle", handle, *tc_arguments]
+    __install_qdiscs([(*TC_REPLACE_ROOT_QDISC, *tc_arguments)], netlink_messages)
+
+
+def __compose_shaped_netem(rate, delay=None, loss=None, duplicate=None):
+    """
+    Replace the root qdisc with an HTB qdisc limiting the bandwidth, with a netem qdisc below it for the other effects.
+    HTB shapes the rate more accurately than the rate option of netem. The whole hierarchy is installed by the same
+    netlink calls or tc batch, one after another, so traffic is never left behind a partially configured hierarchy
+    while the streams start.
+    Args:
+        rate (str): The maximum rate of traffic, e.g. "1mbit".
+        delay (str): The delay to add to packets, e.g. "100ms".
+        loss (str): Percentage of packets to drop.
+        duplicate (str): Percentage of packets to duplicate.
+    Returns:
+        None
+    """
+    netem_arguments, netem_parameters = __netem_arguments(delay=delay, loss=loss, duplicate=duplicate)
+    tc_lines = [
+        # All traffic goes to class 1:1 by default
+        (*TC_REPLACE_ROOT_QDISC, "handle", "1:", "htb", "default", "1"),
+        ("class", "replace", "dev", NETWORK_INTERFACE, "parent", "1:", "classid", "1:1", "htb", "rate", rate),
+        ("qdisc", "replace", "dev", NETWORK_INTERFACE, "parent", "1:1", "handle", "10:", *netem_arguments),
+    ]
+    netlink_messages = [
+        ("replace", "htb", {"handle": __parse_handle("1:"), "default": 1}),
+        (
+            "replace-class",
+            "htb",
+            {"handle": __parse_handle("1:1"), "parent": __parse_handle("1:"), "rate": __parse_rate(rate)},
+        ),
+        ("replace", "netem", {"handle": __parse_handle("10:"), "parent": __parse_handle("1:1"), **netem_parameters}),
+    ]
+    __install_qdiscs(tc_lines, netlink_messages)
+
+
+@functools.lru_cache(maxsize=1)
+def __h264_encoder():
+    """
+    Find the preferred H.264 encoder that is installed, probing the GStreamer registry once per run.
+    Hardware encoders move the encoding off the CPU, which otherwise limits how many simulated streams can run at once.
+    Returns:
+        str: The encoder element with its settings for a GStreamer launch string, x264enc if no other encoder is found.
+    """
+    if Gst is not None:
+        Gst.init(None)
+        for factory_name, encoder in H264_ENCODERS:
+            if Gst.ElementFactory.find(factory_name) is not None:
+                return encoder
+    return H264_ENCODERS[-1][1]
+
 
 # ------------------------- Gstreamer Simulations -------------------------
 
 
+@functools.lru_cache(maxsize=64)
 def normal(video_file):
     """
     Simulate a normal video stream with default encoding settings.
+    The launch string only depends on the video file, so it is built once per file and shared between callers.
     Args:
         video_file: The video file to stream.
     Returns:
         str: The GStreamer launch string for the normal simulation.
     """
-    return f"( filesrc location=./{video_file} ! tsdemux ! queue ! h265parse ! rtph265pay name=pay0 pt=96 )"
+    return NORMAL_LAUNCH.format(video_file=video_file)
 
 
 # ------------------------- Network Simulations -------------------------
@@ -38,22 +414,7 @@ def increased_latency(video_file, delay="100ms", jitter="10ms"):
         str: The GStreamer launch string for the increased latency simulation.
     """
     # Replace the existing network interface settings with increased latency
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "delay",
-            delay,
-            jitter,
-        ],
-        check=True,
-    )
+    __compose_netem(delay=delay, jitter=jitter)
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -67,21 +428,7 @@ def packet_loss(video_file, loss_rate="10%"):
         str: The GStreamer launch string for the packet loss simulation.
     """
     # Replace the exisiting network interface settings with packet loss
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "loss",
-            loss_rate,
-        ],
-        check=True,
-    )
+    __compose_netem(loss=loss_rate)
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -96,29 +443,34 @@ def limited_bandwidth(video_file, rate="1mbit"):
         str: The GStreamer launch string for the bandwidth limitation simulation.
     """
     # Replace the existing network interface settings with limited bandwidth
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "tbf",
-            "rate",
-            rate,
-            "burst",
-            "32kbit",
-            "latency",
-            "400ms",
-        ],
-        check=True,
+    __replace_qdisc(
+        ["tbf", "rate", rate, "burst", "32kbit", "latency", "400ms"],
+        "tbf",
+        rate=__parse_rate(rate),
+        burst=__parse_size("32kbit"),
+        latency=__parse_time("400ms"),
     )
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
 
+def paced_bandwidth(video_file, rate="1mbit"):
+    """
+    Simulate a video stream whose sender is paced to a maximum rate.
+    Unlike the token bucket of limited_bandwidth, the fq qdisc spaces out the packets of every flow with a timer, so
+    the stream is sent smoothly at the rate instead of in bursts.
+    Args:
+        video_file: The video file to stream.
+        rate: The maximum rate of every flow.
+    Returns:
+        str: The GStreamer launch string for the paced bandwidth simulation.
+    """
+    # Replace the existing network interface settings with paced flows, netlink cannot configure fq
+    __replace_qdisc(["fq", "maxrate", rate])
+    # Return a normal simulation string as the network simulation is now active
+    return normal(video_file)
+
+
 def jitter(video_file, delay="100ms", jitter="50ms"):
     """
     Simulate a video stream with jitter in network latency.
@@ -131,24 +483,7 @@ def jitter(video_file, delay="100ms", jitter="50ms"):
         str: The GStreamer launch string for the jitter simulation.
     """
     # Replace the existing network interface settings with jitter
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "delay",
-            delay,
-            jitter,
-            "distribution",
-            "normal",
-        ],
-        check=True,
-    )
+    __compose_netem(delay=delay, jitter=jitter, distribution="normal")
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -163,21 +498,7 @@ def packet_duplication(video_file, duplication_rate="10%"):
         str: The GStreamer launch string for the packet duplication simulation.
     """
     # Replace the existing network interface settings with packet duplication
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "duplicate",
-            duplication_rate,
-        ],
-        check=True,
-    )
+    __compose_netem(duplicate=duplication_rate)
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -193,23 +514,7 @@ def packet_reordering(video_file, correlation="25%", delay="50ms"):
         str: The GStreamer launch string for the packet reordering simulation.
     """
     # Replace the existing network interface settings with packet reordering
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "delay",
-            delay,
-            "reorder",
-            correlation,
-        ],
-        check=True,
-    )
+    __compose_netem(delay=delay, reorder=correlation)
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -224,28 +529,14 @@ def packet_corruption(video_file, corruption_rate="0.1%"):
         str: The GStreamer launch string for the packet corruption simulation.
     """
     # Replace the existing network interface settings with packet corruption
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "netem",
-            "corrupt",
-            corruption_rate,
-        ],
-        check=True,
-    )
+    __compose_netem(corrupt=corruption_rate)
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
 
 def network_congestion(video_file, rate="1mbit", latency="50ms"):
     """
-    Simulate network congestion on the network interface by limiting the bandwidth using TBF along with netem for delay.
+    Simulate network congestion on the network interface by limiting the bandwidth using HTB along with netem for delay.
     Args:
         video_file: The video file to stream.
         rate: The maximum rate of traffic (e.g., '1mbit' for 1 Mbps).
@@ -253,30 +544,8 @@ def network_congestion(video_file, rate="1mbit", latency="50ms"):
     Returns:
         str: The GStreamer launch string for the network congestion simulation.
     """
-
-    subprocess.run(
-        [
-            "sudo",
-            "tc",
-            "qdisc",
-            "replace",
-            "dev",
-            NETWORK_INTERFACE,
-            "root",
-            "handle",
-            "1:",
-            "netem",
-            "rate",
-            rate,
-            "delay",
-            latency,
-            "loss",
-            "0.1%",
-            "duplicate",
-            "0.1%",
-        ],
-        check=True,
-    )
+    # Replace the existing network interface settings with a congested link
+    __compose_shaped_netem(rate, delay=latency, loss="0.1%", duplicate="0.1%")
     # Return a normal simulation string as the network simulation is now active
     return normal(video_file)
 
@@ -284,22 +553,45 @@ def network_congestion(video_file, rate="1mbit", latency="50ms"):
 # ------------------------- Camera Simulations -------------------------
 
 
+@functools.lru_cache(maxsize=64)
 def audio_sync(video_file, audio_delay_ms="500"):
     """
     Simulate synchronization issues between audio and video by introducing a delay in the audio stream.
+    The launch string is built once per video file and audio delay.
     Args:
         video_file: The video file to stream.
         audio_delay_ms: The amount of delay to introduce to the audio stream, in milliseconds.
     Returns:
         str: The GStreamer launch string for the audio-video synchronization issue simulation.
     """
-    return (
-        f"( filesrc location=./{video_file} ! decodebin name=dec "
-        f"dec. ! queue ! audioconvert ! audioresample !"
-        f"queue min-threshold-time={audio_delay_ms}000000 ! avenc_aac ! queue ! mux. "
-        f"dec. ! videoconvert ! videoscale ! x264enc bitrate=500 ! queue ! mux. "
-        f"matroskamux name=mux ! rtph264pay name=pay0 pt=96 )"
-    )
+    return AUDIO_SYNC_LAUNCH.format(video_file=video_file, audio_delay_ms=audio_delay_ms, encoder=__h264_encoder())
+
+
+def __black_screen(video_file):
+    """
+    Stream a black screen instead of the video file.
+    Args:
+        video_file: The video file to stream. Not used, but kept to match the other simulations.
+    Returns:
+        str: The GStreamer launch string for a black screen.
+    """
+    return BLACK_SCREEN_LAUNCH.format(encoder=__h264_encoder())
+
+
+def __delayed_stream(video_file):
+    """
+    Stream the video file after holding it back in a queue.
+    Args:
+        video_file: The video file to stream.
+    Returns:
+        str: The GStreamer launch string for a delayed stream.
+    """
+    return DELAYED_STREAM_LAUNCH.format(video_file=video_file, encoder=__h264_encoder())
+
+
+# Simulations per stream number modulo 4, so every fourth stream gets the failure
+HARDWARE_FAILURE_STREAMS = (__black_screen, normal, normal, normal)
+CAMERA_DELAY_STREAMS = (__delayed_stream, normal, normal, normal)
 
 
 def hardware_failure(video_file):
@@ -311,14 +603,8 @@ def hardware_failure(video_file):
     Returns:
         str: The GStreamer launch string for the hardware failure simulation.
     """
-    global streams_simulated
-    streams_simulated += 1
     # Every fourth stream will be a black screen
-    if streams_simulated % 4 == 0:
-        return "( videotestsrc pattern=black ! video/x-raw,width=1920,height=1080,framerate=24/1 \
-                ! x264enc bitrate=500 ! rtph264pay name=pay0 pt=96 )"
-    else:
-        return normal(video_file)
+    return HARDWARE_FAILURE_STREAMS[next(hardware_failure_streams) & 3](video_file)
 
 
 def camera_delay(video_file):
@@ -329,16 +615,66 @@ def camera_delay(video_file):
     Returns:
         str: The GStreamer launch string for the camera delay simulation.
     """
-    global streams_simulated
-    streams_simulated += 1
     # Every fourth stream will have a delay
-    if streams_simulated % 4 == 0:
-        return (
-            f"( filesrc location=./{video_file} ! decodebin ! queue min-threshold-time=10000000000000000 ! "
-            f"x264enc bitrate=500 ! rtph264pay name=pay0 pt=96 )"
-        )
+    return CAMERA_DELAY_STREAMS[next(camera_delay_streams) & 3](video_file)
+
+
+@functools.lru_cache(maxsize=1)
+def __ffmpeg_hardware_encoder():
+    """
+    Find an ffmpeg H.264 hardware encoder that works on this host, testing them once per run.
+    Encoders are tested by encoding a few generated frames, because ffmpeg also lists encoders whose hardware is absent.
+    Returns:
+        str: The name of the encoder, or None if no hardware encoder works.
+    """
+    for encoder in FFMPEG_HARDWARE_ENCODERS:
+        # Encode a tenth of a second of generated frames and discard the output
+        command = ["ffmpeg", "-v", "quiet", "-f", "lavfi", "-i", "nullsrc=s=256x256:d=0.1"]
+        command += ["-c:v", encoder, "-f", "null", "-"]
+        try:
+            if subprocess.run(command, stdin=subprocess.DEVNULL).returncode == 0:
+                return encoder
+        except OSError:
+            return None
+    return None
+
+
+def __transcode(video_file, effect_name, options, description, hardware_encoding=True):
+    """
+    Start ffmpeg writing a copy of a video file with an effect applied, without waiting for it to finish.
+    The copies of all video files are made in parallel, up to MAX_PARALLEL_TRANSCODES at once. The simulator waits for
+    the processes in pending_transcodes before it serves the streams. Decoding uses hardware acceleration when
+    available, and so does encoding unless the options depend on ffmpeg's default software encoder. The software
+    encoder uses its fastest preset.
+    Args:
+        video_file (str): The video file to process.
+        effect_name (str): Name of the effect, added to the output file name after "_temp_".
+        options (list): The ffmpeg output options applying the effect.
+        description (str): Description of the effect for the log messages.
+        hardware_encoding (bool): Whether a hardware encoder may replace the libx264 software encoder.
+    Returns:
+        str: The path the processed video is written to.
+    """
+    output_video = video_file.rsplit(".", 1)[0] + f"_temp_{effect_name}." + video_file.rsplit(".", 1)[1]
+
+    running = [process for process, _, _ in pending_transcodes if process.poll() is None]
+    if len(running) >= MAX_PARALLEL_TRANSCODES:
+        running[0].wait()
+
+    encoder = __ffmpeg_hardware_encoder() if hardware_encoding else None
+    if encoder is not None:
+        options = [*options, "-c:v", encoder]
     else:
-        return normal(video_file)
+        options = [*options, *FFMPEG_SOFTWARE_ENCODING]
+
+    process = subprocess.Popen(
+        ["ffmpeg", "-y", *FFMPEG_QUIET, "-hwaccel", "auto", "-i", video_file, *options, output_video],
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+    )
+    pending_transcodes.append((process, output_video, description))
+    return output_video
 
 
 def low_resolution(video_file, scale_factor=0.2):
@@ -350,17 +686,7 @@ def low_resolution(video_file, scale_factor=0.2):
     Returns:
         str: The GStreamer launch string for the low resolution simulation.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_low_resolution." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"scale=iw*{scale_factor}:-1",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with low resolution: {output_video}")
+    output_video = __transcode(video_file, "low_resolution", ["-vf", f"scale=iw*{scale_factor}:-1"], "low resolution")
     return normal(output_video)
 
 
@@ -373,10 +699,10 @@ def compression_artifacts(video_file, quality=50):
     Returns:
         str: The GStreamer launch string for the compression artifacts simulation.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_compression_artifacts." + video_file.rsplit(".", 1)[1]
-    command = ["ffmpeg", "-i", video_file, "-crf", str(quality), output_video]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with compression artifacts: {output_video}")
+    # The artifacts come from libx264's constant rate factor, which hardware encoders do not support
+    output_video = __transcode(
+        video_file, "compression_artifacts", ["-crf", str(quality)], "compression artifacts", hardware_encoding=False
+    )
     return normal(output_video)
 
 
@@ -390,17 +716,9 @@ def change_brightness(video_file, brightness_factor=0.5):
     Returns:
         str: The GStreamer launch string for the brightness adjustment simulation.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_brightness." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"eq=brightness={brightness_factor}",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with adjusted brightness: {output_video}")
+    output_video = __transcode(
+        video_file, "brightness", ["-vf", f"eq=brightness={brightness_factor}"], "adjusted brightness"
+    )
     return normal(output_video)
 
 
@@ -412,17 +730,12 @@ def dynamic_change_brightness(video_file, brightness_factor=0.8, period=20):
     Returns:
         str: The GStreamer launch string for the dynamic brightness adjustment simulation.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_dynamic_brightness." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
+    output_video = __transcode(
         video_file,
-        "-vf",
-        f"eq=brightness=sin(2*PI*t/{period})*{brightness_factor}:eval=frame",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with dynamic brightness adjustment: {output_video}")
+        "dynamic_brightness",
+        ["-vf", f"eq=brightness=sin(2*PI*t/{period})*{brightness_factor}:eval=frame"],
+        "dynamic brightness adjustment",
+    )
     return normal(output_video)
 
 
@@ -435,17 +748,15 @@ def complex_blur(video_file, blur_factor=1.0):
     Returns:
         str: The path to the motion blurred video.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_complex_blur." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
+    output_video = __transcode(
         video_file,
-        "-vf",
-        f"minterpolate='mi_mode=mci:mc_mode=aobmc:vsbmc=1',tblend='all_mode=average:all_opacity={blur_factor}'",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with motion blur: {output_video}")
+        "complex_blur",
+        [
+            "-vf",
+            f"minterpolate='mi_mode=mci:mc_mode=aobmc:vsbmc=1',tblend='all_mode=average:all_opacity={blur_factor}'",
+        ],
+        "motion blur",
+    )
     return normal(output_video)
 
 
@@ -458,17 +769,7 @@ def simple_blur(video_file, blur_intensity=1):
     Returns:
         str: The path to the motion blurred video.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_simple_blur." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"avgblur={blur_intensity}",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with motion blur: {output_video}")
+    output_video = __transcode(video_file, "simple_blur", ["-vf", f"avgblur={blur_intensity}"], "motion blur")
     return normal(output_video)
 
 
@@ -481,17 +782,7 @@ def change_contrast(video_file, contrast_factor=2.0):
     Returns:
         str: The path to the contrast-adjusted video.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_contrast." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"eq=contrast={contrast_factor}",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with adjusted contrast: {output_video}")
+    output_video = __transcode(video_file, "contrast", ["-vf", f"eq=contrast={contrast_factor}"], "adjusted contrast")
     return normal(output_video)
 
 
@@ -505,17 +796,12 @@ def dynamic_change_contrast(video_file, contrast_factor=900.0, period=20):
     Returns:
         str: The path to the contrast-adjusted video.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_dynamic_contrast." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
+    output_video = __transcode(
         video_file,
-        "-vf",
-        f"eq=contrast='sin(2*PI*t/{period})*{contrast_factor/1000} + 1':eval=frame",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with dynamic contrast adjustment: {output_video}")
+        "dynamic_contrast",
+        ["-vf", f"eq=contrast='sin(2*PI*t/{period})*{contrast_factor/1000} + 1':eval=frame"],
+        "dynamic contrast adjustment",
+    )
     return normal(output_video)
 
 
@@ -528,17 +814,9 @@ def background_noise(video_file, noise_intensity=50):
     Returns:
         str: The path to the noise-added video.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_noise." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"noise=alls={noise_intensity}:allf=t+u",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with background noise: {output_video}")
+    output_video = __transcode(
+        video_file, "noise", ["-vf", f"noise=alls={noise_intensity}:allf=t+u"], "background noise"
+    )
     return normal(output_video)
 
 
@@ -552,15 +830,7 @@ def horizontal_drift(video_file, duration_effect=20):
     Returns:
         str: The path to the video with the horizontal drift effect.
     """
-    output_video = video_file.rsplit(".", 1)[0] + "_temp_horizontal_drift." + video_file.rsplit(".", 1)[1]
-    command = [
-        "ffmpeg",
-        "-i",
-        video_file,
-        "-vf",
-        f"crop=iw/1.5:ih:iw/4*t/{duration_effect}:0",
-        output_video,
-    ]
-    subprocess.run(command, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-    print(f"Created video file with horizontal drift effect: {output_video}")
+    output_video = __transcode(
+        video_file, "horizontal_drift", ["-vf", f"crop=iw/1.5:ih:iw/4*t/{duration_effect}:0"], "horizontal drift effect"
+    )
     return normal(output_video)
@@ -7,8 +7,14 @@ The available simulation types are defined in the simulations module.
 Usage: python simulator.py <video_folder> <simulation_type>
 """
 
+import inspect
 import subprocess
 from config import (
+    MULTICAST_MAX_ADDRESS,
+    MULTICAST_MAX_PORT,
+    MULTICAST_MIN_ADDRESS,
+    MULTICAST_MIN_PORT,
+    MULTICAST_TTL,
     NETWORK_INTERFACE,
     STREAMING_PORT,
     STREAMING_URL,
@@ -38,7 +44,7 @@ def run_simulation(videos, simulation_type, video_folder_path):
         RTSP server for each video file in the video folder.
     """
     # Check if the simulation type is valid
-    if simulation_type not in simulation_types:
+    if simulation_type not in simulation_functions:
         print("Invalid simulation type. Please specify a valid simulation.")
         print("Available simulations: " + ", ".join(simulation_types))
         sys.exit(1)
@@ -51,23 +57,34 @@ def run_simulation(videos, simulation_type, video_folder_path):
     server.set_service(STREAMING_PORT)
     server.set_address(STREAMING_HOST)
 
-    # Create a default media factory that will create a pipeline for a URI.
-    factory = GstRtspServer.RTSPMediaFactory.new()
+    # Let clients that request multicast share one copy of every stream instead of receiving a copy each
+    address_pool = GstRtspServer.RTSPAddressPool.new()
+    address_pool.add_range(
+        MULTICAST_MIN_ADDRESS, MULTICAST_MAX_ADDRESS, MULTICAST_MIN_PORT, MULTICAST_MAX_PORT, MULTICAST_TTL
+    )
 
     # Perform the operations for the specified simulation type
     print(f"Running {simulation_type} simulation...")
+    simulate = simulation_functions[simulation_type]
+    # Every stream is attached to the same mount points of the server
+    mounts = server.get_mount_points()
+    # Media factories per launch string, so streams with the same pipeline, e.g. black screens, share a factory
+    factories = {}
     i = 0
     for video_file in sorted(videos):
         i += 1
-        launch_string = getattr(simulations, simulation_type)(video_file)
-        factory = GstRtspServer.RTSPMediaFactory.new()
-        # Set the launch string for the media factory
-        factory.set_launch(launch_string)
-        # Share the pipeline between all clients
-        factory.set_shared(True)
+        launch_string = simulate(video_file)
+        factory = factories.get(launch_string)
+        if factory is None:
+            factory = GstRtspServer.RTSPMediaFactory.new()
+            # Set the launch string for the media factory
+            factory.set_launch(launch_string)
+            # Share the pipeline between all clients
+            factory.set_shared(True)
+            factory.set_address_pool(address_pool)
+            factories[launch_string] = factory
 
         # Attach the factory to the streaming path for the video file
-        mounts = server.get_mount_points()
         if "ocr" in video_file:
             i -= 1
             mounts.add_factory("/ocr", factory)
@@ -76,6 +93,10 @@ def run_simulation(videos, simulation_type, video_folder_path):
             mounts.add_factory(f"/{i}", factory)
             print(f"Stream available at {STREAMING_URL}{i}")
 
+    # Configure the network interface and finish processing the videos before clients can connect
+    apply_network_simulation()
+    wait_for_transcodes()
+
     # Start the server
     server.attach(None)
 
@@ -100,6 +121,41 @@ def run_simulation(videos, simulation_type, video_folder_path):
     loop.run()
 
 
+def apply_network_simulation():
+    """
+    Run the tc commands queued by the network simulations as one tc batch, so tc is only started once per run.
+    Args:
+        None
+    Returns:
+        None
+    """
+    if not simulations.pending_tc_commands:
+        return
+    subprocess.run(
+        [*simulations.TC_COMMAND, "-batch", "-"],
+        input="\n".join(simulations.pending_tc_commands) + "\n",
+        text=True,
+        check=True,
+    )
+    simulations.pending_tc_commands.clear()
+
+
+def wait_for_transcodes():
+    """
+    Wait for the ffmpeg processes started by the camera simulations to finish writing the processed videos.
+    Args:
+        None
+    Returns:
+        None
+    """
+    for process, output_video, description in simulations.pending_transcodes:
+        if process.wait() == 0:
+            print(f"Created video file with {description}: {output_video}")
+        else:
+            print(f"Failed to create video file with {description}: {output_video}")
+    simulations.pending_transcodes.clear()
+
+
 def remove_network_simulation():
     """
     Remove the introduced tc configurations to simulate network conditions.
@@ -111,7 +167,7 @@ def remove_network_simulation():
     print("\nStopping network simulation...")
     try:
         subprocess.run(
-            ["sudo", "tc", "qdisc", "del", "dev", NETWORK_INTERFACE, "root"],
+            [*simulations.TC_COMMAND, "qdisc", "del", "dev", NETWORK_INTERFACE, "root"],
             check=True,
             stderr=subprocess.DEVNULL,
         )
@@ -130,21 +186,25 @@ def delete_temp_videos(video_folder_path):
         None
     """
     print("\nDeleting temporary video files...")
-    for video_file in os.listdir(video_folder_path):
-        if "_temp" in video_file:
-            full_path = os.path.join(video_folder_path, video_file)
-            print(f"Deleting temporary video file {full_path}...")
-            os.remove(full_path)
-            print(f"Deleted {full_path} successfully.")
-    else:
-        print("No more temporary video files found, continuing.")
+    deleted = 0
+    with os.scandir(video_folder_path) as entries:
+        for entry in entries:
+            if "_temp" in entry.name and entry.is_file():
+                os.unlink(entry.path)
+                print(f"Deleted {entry.path} successfully.")
+                deleted += 1
+    if not deleted:
+        print("No temporary video files found, continuing.")
 
 
 if __name__ == "__main__":
     # Get the available simulation types from the simulation module
+    simulation_functions = {
+        name: value for name, value in vars(simulations).items() if callable(value) and not name.startswith("__")
+    }
+    # Unwrap cached simulations to sort them by the line of the function they wrap
     simulation_types = sorted(
-        [func for func in dir(simulations) if callable(getattr(simulations, func)) and not func.startswith("__")],
-        key=lambda x: getattr(simulations, x).__code__.co_firstlineno,
+        simulation_functions, key=lambda name: inspect.unwrap(simulation_functions[name]).__code__.co_firstlineno
     )
 
     # Get the simulation type from the command line arguments
@@ -159,12 +219,12 @@ if __name__ == "__main__":
             sys.exit(1)
 
         # Only append video files to the list of videos, files with extensions .mp4, .avi, .mkv.
-        videos = [
-            os.path.join(video_folder, video)
-            for video in os.listdir(video_folder)
-            if os.path.isfile(os.path.join(video_folder, video))
-            and video.lower().endswith((".mp4", ".avi", ".mkv", ".ts"))
-        ]
+        with os.scandir(video_folder) as entries:
+            videos = [
+                entry.path
+                for entry in entries
+                if entry.name.lower().endswith((".mp4", ".avi", ".mkv", ".ts")) and entry.is_file()
+            ]
 
         # Check if the video folder contains any video files
         if not videos:
@@ -173,16 +233,14 @@ if __name__ == "__main__":
 
         # Check if the video files are accessible
         for video in videos:
-            try:
-                open(video)
-            except FileNotFoundError:
+            if not os.access(video, os.R_OK):
                 print(f"The video '{video}' is inaccessible.")
                 sys.exit(1)
 
         simulation_type = sys.argv[2]
 
         # Check if the simulation type is valid
-        if simulation_type not in simulation_types:
+        if simulation_type not in simulation_functions:
             print("Invalid simulation type. Please specify a valid simulation.")
             print("Usage: python3 simulator.py <video_folder> <simulation_type>")
             print("Available simulations: " + ", ".join(simulation_types))
@@ -5,10 +5,13 @@ This module is used by the validator.py script to validate video files and their
 It should not be run directly but imported by the validator.py script.
 """
 
+import functools
+import json
 import subprocess
 import cv2
-import numpy as np
 import os
+import queue
+import threading
 import xml.etree.ElementTree as ET
 import time
 
@@ -27,6 +30,148 @@ def __print_test(message):
     print(f"{message}{'.' * max(dot_count, 1)}", end="", flush=True)
 
 
+def __open_video_capture(video_file):
+    """
+    Open a video file with the FFmpeg backend, requesting hardware-accelerated decoding when available.
+    OpenCV silently falls back to software decoding when no hardware decoder can be used.
+    Args:
+        video_file (str): Path to the video file.
+    Returns:
+        cv2.VideoCapture: The opened video capture.
+    """
+    cap = cv2.VideoCapture(video_file, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+    if not cap.isOpened():
+        # Fall back to the default backend, e.g. when OpenCV is built without FFmpeg
+        cap = cv2.VideoCapture(video_file)
+    return cap
+
+
+# Lets only one validation at a time probe a video file, so validations running at once share one probe per file
+__probe_lock = threading.Lock()
+
+
+def __probe_stream(video_file, codec_type):
+    """
+    Get the parameters of the first stream of a type in a video file.
+    All streams of a file are read with a single ffprobe run, which the stream validators share.
+    Args:
+        video_file (str): Path to the video file.
+        codec_type (str): The type of stream, "video" or "audio".
+    Returns:
+        dict: The parameters of the stream, or None if the file has no such stream or could not be analyzed.
+    """
+    with __probe_lock:
+        streams = __read_streams(video_file)
+    return next((stream for stream in streams if stream.get("codec_type") == codec_type), None)
+
+
+@functools.lru_cache(maxsize=8)
+def __read_streams(video_file):
+    """
+    Run ffprobe on a video file for the parameters of all its streams, once per file.
+    Args:
+        video_file (str): Path to the video file.
+    Returns:
+        tuple: The codec_type, codec_name, width, height, r_frame_rate, bit_rate and sample_rate of every stream as
+            reported by ffprobe, empty if the file could not be analyzed.
+    """
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "stream=codec_type,codec_name,width,height,r_frame_rate,bit_rate,sample_rate",
+            "-of",
+            "json",
+            video_file,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        return ()
+    return tuple(json.loads(result.stdout).get("streams", ()))
+
+
+def has_audio_stream(video_file):
+    """
+    Check if the video file contains an audio stream, using the stream probe shared with the validations.
+    Args:
+        video_file (str): Path to the video file.
+    Returns:
+        bool: True if the video contains an audio stream, False otherwise.
+    """
+    return __probe_stream(video_file, "audio") is not None
+
+
+def __decode_in_background(cap, frame_skip=1, convert=None):
+    """
+    Decode the frames of a video capture on a separate thread, so that decoding overlaps with processing the frames.
+    Skipped frames are only grabbed, not retrieved and converted to BGR. Closing the generator stops the decoding.
+    Args:
+        cap (cv2.VideoCapture): The opened video capture.
+        frame_skip (int): Yield every frame_skip-th frame.
+        convert (callable): Conversion applied to every yielded frame on the decoding thread, e.g. to grayscale.
+    Yields:
+        numpy.ndarray: The decoded, and possibly converted, frames.
+    """
+    frame_queue = queue.Queue(maxsize=8)
+    stop_decoding = threading.Event()
+    # Exception raised on the decoding thread, re-raised by the consumer at the end of the frames
+    errors = []
+
+    def enqueue(item):
+        # Wait for space in the queue, unless the processing has already finished
+        while not stop_decoding.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def decode_frames():
+        frame_count = 0
+        try:
+            while not stop_decoding.is_set():
+                # Only grab the frame here, it is retrieved and converted to BGR when it is not skipped
+                if not cap.grab():
+                    break  # End of video
+
+                frame_count += 1
+
+                if frame_count % frame_skip != 0:
+                    continue  # Skip frames
+
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+
+                enqueue(convert(frame) if convert is not None else frame)
+        except Exception as e:
+            # Hand the error to the consumer, instead of ending the video as if all frames were decoded
+            errors.append(e)
+        finally:
+            # Signal the end of the video
+            enqueue(None)
+
+    decoder = threading.Thread(target=decode_frames, daemon=True)
+    decoder.start()
+
+    try:
+        while True:
+            frame = frame_queue.get()
+            if frame is None:
+                break
+            yield frame
+        if errors:
+            raise errors[0]
+    finally:
+        stop_decoding.set()
+        decoder.join()
+
+
 def validate_ocr_similarity(original_log, simulated_log, similarity_threshold=0.95):
     """
     Validate that OCR output for the original and simulated videos are similar.
@@ -103,7 +248,7 @@ def validate_overlay_similarity(
     __print_test("Validating Overlay Image in Simulated Video")
     try:
         # Open the video file and check for the presence of the overlay image
-        cap = cv2.VideoCapture(simulated_video)
+        cap = __open_video_capture(simulated_video)
         if not cap.isOpened():
             __print_failure("Error! Could not open video file")
             return False
@@ -126,40 +271,32 @@ def validate_overlay_similarity(
         # Counter for consecutive matches
         consecutive_matches = 0
 
-        frame_count = 0
         found = False
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break  # End of video
+        # Decode the frames on a separate thread, so that decoding overlaps with the template matching
+        gray_frames = __decode_in_background(cap, frame_skip, lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
 
-            frame_count += 1
-
-            if frame_count % frame_skip != 0:
-                continue  # Skip frames
-
-            # Convert the frame to grayscale
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Perform template matching
-            if mask is not None:
-                res = cv2.matchTemplate(gray_frame, overlay_gray, cv2.TM_CCOEFF_NORMED, mask=mask)
-            else:
-                res = cv2.matchTemplate(gray_frame, overlay_gray, cv2.TM_CCOEFF_NORMED)
+        try:
+            for gray_frame in gray_frames:
+                # Perform template matching
+                if mask is not None:
+                    res = cv2.matchTemplate(gray_frame, overlay_gray, cv2.TM_CCOEFF_NORMED, mask=mask)
+                else:
+                    res = cv2.matchTemplate(gray_frame, overlay_gray, cv2.TM_CCOEFF_NORMED)
 
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+                _, max_val, _, max_loc = cv2.minMaxLoc(res)
 
-            # Check if match is above the threshold
-            if max_val >= match_threshold:
-                consecutive_matches += 1
-                if consecutive_matches >= consecutive_matches_needed:
-                    found = True
-                    break
-            else:
-                consecutive_matches = 0
-
-        cap.release()
+                # Check if match is above the threshold
+                if max_val >= match_threshold:
+                    consecutive_matches += 1
+                    if consecutive_matches >= consecutive_matches_needed:
+                        found = True
+                        break
+                else:
+                    consecutive_matches = 0
+        finally:
+            gray_frames.close()
+            cap.release()
 
         if found:
             total_time = time.time() - start_time
@@ -192,10 +329,10 @@ def validate_vmaf(original_video, simulated_video, min_vmaf_score=75):
     start_time = time.time()
     __print_test(f"Validating VMAF score (>= {min_vmaf_score})")
     try:
-        # Convert original video to Y4M format
+        # Convert original video to Y4M format, without the progress statistics that would only fill the captured stderr
         original_y4m = "original_video.y4m"
         conversion_result = subprocess.run(
-            ["ffmpeg", "-y", "-i", original_video, "-pix_fmt", "yuv420p", original_y4m],
+            ["ffmpeg", "-y", "-nostats", "-i", original_video, "-pix_fmt", "yuv420p", original_y4m],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
@@ -211,6 +348,7 @@ def validate_vmaf(original_video, simulated_video, min_vmaf_score=75):
             [
                 "ffmpeg",
                 "-y",
+                "-nostats",
                 "-i",
                 simulated_video,
                 "-pix_fmt",
@@ -292,22 +430,7 @@ def validate_video_sync(simulated_video):
     __print_test("Validating video and audio sync")
     try:
         # Use ffprobe to check for the presence of an audio stream in the video file
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-i",
-                simulated_video,
-                "-show_streams",
-                "-select_streams",
-                "a",
-                "-loglevel",
-                "error",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        if "Stream #0" in result.stdout:
+        if __probe_stream(simulated_video, "audio") is not None:
             total_time = time.time() - start_time
             __print_success(f"Success! Video and audio are in sync. Time taken: {total_time} seconds.")
             return True
@@ -331,17 +454,35 @@ def validate_no_black_frames(simulated_video):
     start_time = time.time()
     __print_test("Validating no black frames")
     try:
-        # Open the video file and check for black frames
-        cap = cv2.VideoCapture(simulated_video)
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            if np.sum(frame) == 0:
-                time_taken = time.time() - start_time
-                __print_failure(f"Failed! Black frame detected. Time taken: {time_taken:.2f} seconds.")
-                return False
-        cap.release()
+        # Let ffmpeg's blackdetect filter find frames in which every pixel is black, and discard the decoded output.
+        # With no minimum duration, a single black frame is reported
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostats",
+                "-i",
+                simulated_video,
+                "-vf",
+                "blackdetect=d=0:pic_th=1:pix_th=0",
+                "-an",
+                "-f",
+                "null",
+                "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+        if result.returncode != 0:
+            __print_failure("Error! Could not analyze video file")
+            return False
+
+        if "black_start" in result.stderr:
+            time_taken = time.time() - start_time
+            __print_failure(f"Failed! Black frame detected. Time taken: {time_taken:.2f} seconds.")
+            return False
         time_taken = time.time() - start_time
         __print_success(f"Success! No black frames detected. Time taken: {time_taken:.2f} seconds.")
         return True
@@ -364,31 +505,14 @@ def validate_minimum_fps(video_file, min_fps=20):
 
     try:
         # Use ffprobe to get the frame rate of the video file
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=r_frame_rate",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                video_file,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
+        stream = __probe_stream(video_file, "video")
 
-        if result.returncode != 0:
+        if stream is None:
             __print_failure("Error! Could not analyze video file")
             return False
 
         # Extract and calculate FPS from the ffprobe output
-        r_frame_rate = result.stdout.strip()
-        num, denom = map(int, r_frame_rate.split("/"))
+        num, denom = map(int, stream["r_frame_rate"].split("/"))
         fps = num / denom
 
         if fps < min_fps:
@@ -418,18 +542,14 @@ def validate_minimum_resolution(simulated_video, min_width=1280, min_height=720)
     start_time = time.time()
     __print_test(f"Validating resolution (>={min_width}x{min_height})")
     try:
-        # Open the video file and check its resolution
-        cap = cv2.VideoCapture(simulated_video)
-        if not cap.isOpened():
-            __print_failure("Error! Could not open video file")
-            return False
+        # Use ffprobe to read the resolution from the stream parameters, without decoding any frames
+        stream = __probe_stream(simulated_video, "video")
 
-        ret, frame = cap.read()
-        if not ret:
-            __print_failure("Error! Can't receive frame. Video may have ended.")
+        if stream is None:
+            __print_failure("Error! Could not analyze video file")
             return False
 
-        height, width = frame.shape[:2]
+        width, height = stream["width"], stream["height"]
         if width < min_width or height < min_height:
             total_time = time.time() - start_time
             __print_failure(
@@ -461,29 +581,13 @@ def validate_bitrate(simulated_video, min_bitrate_kbps=500):
     start_time = time.time()
     __print_test(f"Validating bitrate (>= {min_bitrate_kbps} kbps)")
     try:
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=bit_rate",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                simulated_video,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
+        stream = __probe_stream(simulated_video, "video")
 
-        if result.returncode != 0:
+        if stream is None:
             __print_failure("Error! Could not analyze video file")
             return False
 
-        bitrate_kbps = int(result.stdout.strip()) / 1000
+        bitrate_kbps = int(stream["bit_rate"]) / 1000
 
         if bitrate_kbps >= min_bitrate_kbps:
             total_time = time.time() - start_time
@@ -578,54 +682,15 @@ def validate_audio_quality(simulated_video, min_bitrate_kbps=64, min_sample_rate
     __print_test(f"Validating audio quality (>= {min_bitrate_kbps} kbps, >= {min_sample_rate_hz} Hz)")
     try:
         # Check if the video has an audio stream
-        audio_check_result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "a:0",
-                "-show_entries",
-                "stream=index",
-                "-of",
-                "csv=p=0",
-                simulated_video,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
+        stream = __probe_stream(simulated_video, "audio")
 
-        if audio_check_result.returncode != 0 or not audio_check_result.stdout.strip():
+        if stream is None:
             __print_failure("Failed! No audio stream found.")
             return False
 
         # If audio stream exists, check the bitrate and sample rate
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "a:0",
-                "-show_entries",
-                "stream=bit_rate,sample_rate",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                simulated_video,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
-
-        if result.returncode != 0:
-            __print_failure("Error! Could not analyze audio stream")
-            return False
-
-        lines = result.stdout.strip().split("\n")
-        bitrate_kbps = int(lines[0]) / 1000
-        sample_rate_hz = int(lines[1])
+        bitrate_kbps = int(stream["bit_rate"]) / 1000
+        sample_rate_hz = int(stream["sample_rate"])
 
         if bitrate_kbps >= min_bitrate_kbps and sample_rate_hz >= min_sample_rate_hz:
             total_time = time.time() - start_time
@@ -659,29 +724,13 @@ def validate_video_codec(simulated_video, required_codec="h264"):
     start_time = time.time()
     __print_test(f"Validating video codec ({required_codec})")
     try:
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=codec_name",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                simulated_video,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
+        stream = __probe_stream(simulated_video, "video")
 
-        if result.returncode != 0:
+        if stream is None:
             __print_failure("Error! Could not analyze video codec")
             return False
 
-        codec = result.stdout.strip()
+        codec = stream["codec_name"]
 
         if codec == required_codec:
             total_time = time.time() - start_time
@@ -6,91 +6,126 @@ and a VMAF option as arguments, and validates them.
 Usage: python validator.py <video_folder> <video_logs> <ocr_logs> <vmaf_option>
 """
 
+import io
 import os
 import sys
-import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import validations
 
 
-def has_audio_stream(video_file):
+class ThreadOutput(io.TextIOBase):
     """
-    Check if the video file contains an audio stream.
+    Standard output that keeps what validations print on worker threads in a buffer per thread, so validations can run
+    at the same time and still have their output printed in order. Other threads print directly.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_captured(output, validation, *args):
+    """
+    Run a validation while capturing everything it prints on this thread.
     Args:
-        video_file (str): Path to the video file.
+        output (ThreadOutput): The standard output collecting the printed output.
+        validation (callable): The validation to run.
+        args: The arguments of the validation.
     Returns:
-        bool: True if the video contains an audio stream, False otherwise.
+        tuple: The result of the validation, or the exception it raised, and its printed output.
     """
+    buffer = output.buffers[threading.get_ident()] = io.StringIO()
     try:
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-i",
-                video_file,
-                "-show_streams",
-                "-select_streams",
-                "a",
-                "-loglevel",
-                "error",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        return "Stream #0" in result.stdout
+        return validation(*args), buffer.getvalue()
     except Exception as e:
-        print(f"\033[31mError checking for audio stream: {e}\033[0m")
-        return False
+        return e, buffer.getvalue()
+    finally:
+        del output.buffers[threading.get_ident()]
 
 
 def validate_video_files_and_logs(original_video, simulated_video, video_logs, ocr_logs, original_overlay, vmaf_option):
-    validation_types = sorted(
-        [func for func in dir(validations) if callable(getattr(validations, func)) and not func.startswith("__")],
-        key=lambda x: getattr(validations, x).__code__.co_firstlineno,
-    )
+    # Collect the validation functions in one pass over the module, in the order they are defined. Only the validate_
+    # functions are validations, the module also has public helpers such as has_audio_stream
+    validation_functions = {
+        name: value for name, value in vars(validations).items() if callable(value) and name.startswith("validate_")
+    }
+    validation_types = sorted(validation_functions, key=lambda name: validation_functions[name].__code__.co_firstlineno)
 
     error_count = 0
     failed_validations = []
 
     # Check if the simulated video has an audio stream
-    simulated_video_has_audio = has_audio_stream(simulated_video)
-
-    for func in validation_types:
-        try:
-            if func == "validate_ocr_similarity":
-                original_log = os.path.join(ocr_logs, "original_ocr.log")
-                simulated_log = os.path.join(ocr_logs, "simulated_ocr.log")
-                result = getattr(validations, func)(original_log, simulated_log)
-            elif func == "validate_error_similarity":
-                original_log = os.path.join(video_logs, "original_video.log")
-                simulated_log = os.path.join(video_logs, "simulated_video.log")
-                result = getattr(validations, func)(original_log, simulated_log)
-            elif func == "validate_vmaf":
-                if vmaf_option == 0:
-                    print(
-                        f"\033[33mSkipping {func} - VMAF validation disabled by argument in run-command."
-                        "Change the 0 to 1 to activate.\033[0m"
-                    )
-                    continue
-                else:
-                    result = getattr(validations, func)(original_video, simulated_video)
-            elif func in ["validate_video_sync", "validate_audio_quality"]:
-                if simulated_video_has_audio:
-                    result = getattr(validations, func)(simulated_video)
+    simulated_video_has_audio = validations.has_audio_stream(simulated_video)
+
+    # Run the validations at the same time, as they mostly wait for ffprobe, ffmpeg, vmaf and OpenCV decoding. Their
+    # output is captured per thread and printed in the order of the validations
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            # The future of every validation that runs, or the message explaining why it is skipped
+            runs = []
+            for func in validation_types:
+                if func == "validate_ocr_similarity":
+                    original_log = os.path.join(ocr_logs, "original_ocr.log")
+                    simulated_log = os.path.join(ocr_logs, "simulated_ocr.log")
+                    args = (original_log, simulated_log)
+                elif func == "validate_error_similarity":
+                    original_log = os.path.join(video_logs, "original_video.log")
+                    simulated_log = os.path.join(video_logs, "simulated_video.log")
+                    args = (original_log, simulated_log)
+                elif func == "validate_vmaf":
+                    if vmaf_option == 0:
+                        runs.append(
+                            (
+                                func,
+                                f"\033[33mSkipping {func} - VMAF validation disabled by argument in run-command."
+                                "Change the 0 to 1 to activate.\033[0m",
+                            )
+                        )
+                        continue
+                    else:
+                        args = (original_video, simulated_video)
+                elif func in ["validate_video_sync", "validate_audio_quality"]:
+                    if simulated_video_has_audio:
+                        args = (simulated_video,)
+                    else:
+                        runs.append(
+                            (func, f"\033[33mSkipping {func} - no audio stream found in the simulated video.\033[0m")
+                        )
+                        continue
+                elif func == "validate_overlay_similarity":
+                    args = (original_overlay, simulated_video)
                 else:
-                    print(f"\033[33mSkipping {func} - no audio stream found in the simulated video.\033[0m")
+                    args = (simulated_video,)
+                runs.append((func, executor.submit(run_captured, output, validation_functions[func], *args)))
+
+            for func, run in runs:
+                if isinstance(run, str):
+                    print(run)
                     continue
-            elif func == "validate_overlay_similarity":
-                result = getattr(validations, func)(original_overlay, simulated_video)
-            else:
-                result = getattr(validations, func)(simulated_video)
-
-            if not result:
-                failed_validations.append(func)
-                error_count += 1
-        except Exception as e:
-            print(f"\033[31mError during validation '{func}': {e}\033[0m")
-            error_count += 1
+
+                result, printed = run.result()
+                print(printed, end="")
+                if isinstance(result, Exception):
+                    print(f"\033[31mError during validation '{func}': {result}\033[0m")
+                    error_count += 1
+                elif not result:
+                    failed_validations.append(func)
+                    error_count += 1
+    finally:
+        sys.stdout = output.stream
 
     if error_count == 0:
         print("\033[32mSuccess! All validations passed.\033[0m")